@@ -27,6 +27,69 @@ print_error() {
     echo -e "${RED}[ERROR]${NC} $1"
 }
 
+# Ollama server settings (export before running this script to override)
+# OLLAMA_NUM_PARALLEL lets the server batch that many requests per model
+export OLLAMA_NUM_PARALLEL="${OLLAMA_NUM_PARALLEL:-4}"
+# Fused flash-attention kernels, with an 8-bit KV cache (needs flash attention)
+export OLLAMA_FLASH_ATTENTION="${OLLAMA_FLASH_ATTENTION:-1}"
+export OLLAMA_KV_CACHE_TYPE="${OLLAMA_KV_CACHE_TYPE:-q8_0}"
+# Quantization of the suggested llama3.2:3b-instruct model (q4_K_M, q5_K_M, q8_0, fp16)
+OLLAMA_QUANT="${OLLAMA_QUANT:-q4_K_M}"
+
+# Print the NUMA node GPU 0 is attached to (nothing on single-node hosts)
+gpu_numa_node() {
+    local bus_id node
+    command -v nvidia-smi &> /dev/null || return 0
+    bus_id=$(nvidia-smi --query-gpu=pci.bus_id --format=csv,noheader -i 0 2> /dev/null | tr 'A-F' 'a-f') || return 0
+    node=$(cat "/sys/bus/pci/devices/${bus_id#0000}/numa_node" 2> /dev/null) || return 0
+    if [ "$node" -ge 0 ] 2> /dev/null && [ -d /sys/devices/system/node/node1 ]; then
+        echo "$node"
+    fi
+}
+
+# Pass the server settings to the systemd-managed ollama service
+configure_ollama_service() {
+    local numa_node
+    numa_node=$(gpu_numa_node)
+
+    print_status "Configuring ollama service (OLLAMA_NUM_PARALLEL=$OLLAMA_NUM_PARALLEL)..."
+    sudo mkdir -p /etc/systemd/system/ollama.service.d
+    sudo tee /etc/systemd/system/ollama.service.d/verilogeval.conf > /dev/null << EOF
+[Service]
+Environment="OLLAMA_NUM_PARALLEL=${OLLAMA_NUM_PARALLEL}"
+Environment="OLLAMA_FLASH_ATTENTION=${OLLAMA_FLASH_ATTENTION}"
+Environment="OLLAMA_KV_CACHE_TYPE=${OLLAMA_KV_CACHE_TYPE}"
+EOF
+
+    # Keep the server's threads and memory on the socket local to the GPU
+    if [ -n "$numa_node" ]; then
+        print_status "Pinning ollama service to NUMA node $numa_node (local to GPU 0)"
+        sudo tee -a /etc/systemd/system/ollama.service.d/verilogeval.conf > /dev/null << EOF
+CPUAffinity=$(cat /sys/devices/system/node/node${numa_node}/cpulist)
+NUMAPolicy=bind
+NUMAMask=${numa_node}
+EOF
+    fi
+    sudo systemctl daemon-reload
+}
+
+# Apply the server settings and (re)start the ollama service with them
+restart_ollama_service() {
+    configure_ollama_service
+    sudo systemctl restart ollama
+}
+
+# Wait for the Ollama API to answer, polling with a per-request timeout
+wait_for_ollama() {
+    for _ in $(seq 1 15); do
+        if curl -s --max-time 2 http://localhost:11434/api/tags > /dev/null; then
+            return 0
+        fi
+        sleep 2
+    done
+    print_warning "Ollama server is still not responding"
+}
+
 # Check if we're on Linux
 if [[ "$OSTYPE" != "linux-gnu"* ]]; then
     print_error "This script is designed for Linux systems"
@@ -73,8 +136,9 @@ if ! check_command ollama; then
         # Start Ollama service
         print_status "Starting Ollama service..."
         if command -v systemctl &> /dev/null; then
-            sudo systemctl start ollama
+            restart_ollama_service
             sudo systemctl enable ollama
+            wait_for_ollama
         else
             print_warning "systemctl not available. You may need to start Ollama manually with 'ollama serve'"
         fi
@@ -176,17 +240,34 @@ except ImportError as e:
 print_status "Testing Ollama connection..."
 
 # Check if Ollama is running
-if ! curl -s http://localhost:11434/api/tags > /dev/null; then
+if ! curl -s --max-time 5 http://localhost:11434/api/tags > /dev/null; then
     print_warning "Ollama server not responding. Starting Ollama..."
     
     # Try to start Ollama
     if command -v systemctl &> /dev/null; then
-        sudo systemctl start ollama
-        sleep 3
+        restart_ollama_service
     else
         print_warning "Starting Ollama manually (this will run in background)"
-        ollama serve &
-        sleep 5
+        NUMA_NODE=$(gpu_numa_node)
+        if [ -n "$NUMA_NODE" ] && command -v numactl &> /dev/null; then
+            print_status "Pinning Ollama to NUMA node $NUMA_NODE (local to GPU 0)"
+            numactl --cpunodebind=$NUMA_NODE --membind=$NUMA_NODE ollama serve &
+        else
+            ollama serve &
+        fi
+    fi
+    wait_for_ollama
+elif [ ! -f /etc/systemd/system/ollama.service.d/verilogeval.conf ]; then
+    print_warning "Ollama is already running and may not have the VerilogEval server settings"
+    if command -v systemctl &> /dev/null && systemctl is-active --quiet ollama; then
+        read -p "Apply them now? This restarts the ollama service (y/n): " -n 1 -r
+        echo
+        if [[ $REPLY =~ ^[Yy]$ ]]; then
+            restart_ollama_service
+            wait_for_ollama
+        fi
+    else
+        print_warning "Restart 'ollama serve' after 'source activate_verilogeval.sh' to apply them"
     fi
 fi
 
@@ -194,12 +275,25 @@ fi
 print_status "Available Ollama models:"
 ollama list
 
-# Suggest models to pull if none are available
-if ! ollama list | grep -q "NAME"; then
+# Suggest models to pull if none are available (only the header is listed)
+if [ "$(ollama list | wc -l)" -le 1 ]; then
+    case "$OLLAMA_QUANT" in
+        q4_K_M) QUANT_SIZE=" (2.0GB)" ;;
+        q5_K_M) QUANT_SIZE=" (2.3GB)" ;;
+        q8_0)   QUANT_SIZE=" (3.4GB)" ;;
+        fp16)   QUANT_SIZE=" (6.4GB)" ;;
+        *)      QUANT_SIZE="" ;;
+    esac
     print_warning "No models found. Recommended models to pull:"
-    echo "  ollama pull llama3.2:1b      # Smallest, fastest (1.3GB)"
-    echo "  ollama pull mistral:latest   # Good general performance (4.1GB)" 
-    echo "  ollama pull codellama:7b     # Good for code generation (3.8GB)"
+    printf "  ollama pull %-28s # %s\n" "llama3.2:1b" "Smallest, fastest (1.3GB)"
+    printf "  ollama pull %-28s # %s\n" "llama3.2:3b-instruct-${OLLAMA_QUANT}" \
+        "Quantized 3B, set OLLAMA_QUANT to change${QUANT_SIZE}"
+    if [ "$OLLAMA_QUANT" != "q8_0" ]; then
+        printf "  ollama pull %-28s # %s\n" "llama3.2:3b-instruct-q8_0" \
+            "Higher-fidelity 3B to compare against (3.4GB)"
+    fi
+    printf "  ollama pull %-28s # %s\n" "mistral:latest" "Good general performance (4.1GB)"
+    printf "  ollama pull %-28s # %s\n" "codellama:7b" "Good for code generation (3.8GB)"
     echo ""
     read -p "Pull llama3.2:1b model now? (y/n): " -n 1 -r
     echo
@@ -238,12 +332,56 @@ echo "Available commands:"
 echo "  python simple_eval.py --help"
 echo "  python scripts/sv-generate --list-models" 
 echo "  ollama list"
+echo "  ollama_warm <model> [host:port ...]   # preload a model before an evaluation run"
 
 # Set up environment variables
 export VERILOGEVAL_ROOT=$(pwd)
 export PYTHONPATH="${VERILOGEVAL_ROOT}:${PYTHONPATH}"
 EOF
 
+# Record the server settings chosen for this setup in the helper script
+cat >> activate_verilogeval.sh << EOF
+
+# Ollama server settings, picked up when running 'ollama serve' by hand
+export OLLAMA_NUM_PARALLEL="\${OLLAMA_NUM_PARALLEL:-${OLLAMA_NUM_PARALLEL}}"
+export OLLAMA_FLASH_ATTENTION="\${OLLAMA_FLASH_ATTENTION:-${OLLAMA_FLASH_ATTENTION}}"
+export OLLAMA_KV_CACHE_TYPE="\${OLLAMA_KV_CACHE_TYPE:-${OLLAMA_KV_CACHE_TYPE}}"
+EOF
+
+cat >> activate_verilogeval.sh << 'EOF'
+
+# Load a model into memory and keep it resident, so the first evaluation
+# request doesn't stall on the model load. Unload with 'ollama stop <model>'
+# Usage: ollama_warm <model> [host:port ...]   (defaults to $OLLAMA_HOST)
+ollama_warm() {
+    local model=$1 host status=0
+    if [ -z "$model" ]; then
+        echo "Usage: ollama_warm <model> [host:port ...]" >&2
+        return 1
+    fi
+    shift
+    for host in "${@:-${OLLAMA_HOST:-localhost:11434}}"; do
+        # Same rules as OLLAMA_HOST: a bare host means http on port 11434
+        host=${host%/}
+        case "$host" in
+            http://*|https://*) ;;
+            *)
+                if [[ $host != *:* || $host == *\] ]]; then
+                    host="$host:11434"
+                fi
+                host="http://$host"
+                ;;
+        esac
+        if ! curl -fsS "$host/api/generate" \
+            -d "{\"model\": \"$model\", \"prompt\": \"\", \"keep_alive\": -1}" > /dev/null; then
+            echo "ollama_warm: could not load $model on $host" >&2
+            status=1
+        fi
+    done
+    return $status
+}
+EOF
+
 chmod +x activate_verilogeval.sh
 
 print_status "Setup complete!"